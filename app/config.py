@@ -105,3 +105,27 @@ class Config:
     def get_logging_retention_days(self):
         """获取日志保留天数"""
         return self.config_data.get("logging", {}).get("retention_days", 30)
+
+    def get_logging_buffer_size(self):
+        """获取内存中保留的日志条数"""
+        return self.config_data.get("logging", {}).get("buffer_size", 1000)
+
+    def get_logging_task_retention_days(self):
+        """获取按任务设置的日志保留天数"""
+        return self.config_data.get("logging", {}).get("task_retention_days", {})
+
+    def get_logging_max_total_size_mb(self):
+        """获取日志总大小上限（MB）"""
+        return self.config_data.get("logging", {}).get("max_total_size_mb", None)
+
+    def get_logging_compress_after_days(self):
+        """获取日志压缩天数"""
+        return self.config_data.get("logging", {}).get("compress_after_days", None)
+
+    def get_logging_compression(self):
+        """获取日志压缩格式（gzip/zstd）"""
+        return self.config_data.get("logging", {}).get("compression", "gzip")
+
+    def get_media_server(self):
+        """获取媒体服务器刷新通知配置"""
+        return self.config_data.get("media_server", {})
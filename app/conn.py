@@ -1,4 +1,3 @@
-from p115client import P115Client
 from pathlib import Path
 import config
 
@@ -7,6 +6,7 @@ class Conn:
     def __init__(self):
         self.config = config.Config().config_data
         self.cookie = self.config.get('cookie')  # 获取cookie值
+        from p115client import P115Client  # p115client 较大，首次创建连接时才导入
         self.client = P115Client(self.cookie)
 
     # get Client
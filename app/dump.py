@@ -1,29 +1,74 @@
 import os
 import shutil
+import logging
 import config
 
+
+def get_rule(file_path, rules):
+    """ 根据文件的扩展名从任务规则中获取对应的规则，没有匹配的规则（包括没有扩展名的目录）时返回 None """
+    file_extension = os.path.splitext(file_path)[1]
+    if not file_extension:
+        return None
+    for rule in rules:
+        if file_extension in rule['extensions'].split(';'):
+            return rule
+    return None
+
+
+def get_method(file_path, rules):
+    """ 根据文件的扩展名从任务规则中获取对应的处理方法 """
+    rule = get_rule(file_path, rules)
+    return rule['method'] if rule else 'ignore'  # 默认忽略
+
+
 class Dump:
-    def __init__(self, source_tree, target_tree, task):
+    def __init__(self, source_tree, target_tree, task, logger=None, target_index=None):
         """
         初始化 Dump 实例
 
         :param source_tree: 源目录树（路径列表）
         :param target_tree: 目标目录树（路径列表）
         :param task: 当前任务配置
+        :param logger: job 的 logger，文件级日志写入 job 日志文件
+        :param target_index: 常驻目标目录索引（TargetIndex），文件操作后同步更新
         """
-        self.config = config.Config().get_config()
+        self.config = config.Config().config_data
+        self.mount_path = self.config.get('mount_path', '')
         self.source_tree = source_tree
         self.target_tree = target_tree
         self.task = task  # 任务配置，决定是否执行文件操作
+        self.source_root = task.get_source_path().rstrip('/')  # 源路径（115 中的路径）
+        self.target_root = task.get_target_path().strip('/')  # 目标路径（相对 mount_path）
+        self.logger = logger or logging.getLogger(__name__)
+        self.target_index = target_index
+        self.changed_dirs = set()  # 变更日志：本次写入或删除过文件的目录，供媒体库刷新通知使用
 
-    def run(self):
+    def run(self, changes=None):
         """
         执行 dump 操作：根据 source 和 target tree 的差异，执行新增、删除操作
+
+        :param changes: 已经计算好的 (added, deleted)，并行模式下由 parallel.diff 计算
         """
-        added, deleted = self.parseTree(self.source_tree, self.target_tree)
+        added, deleted = changes if changes is not None else self.parseTree(self.source_tree, self.target_tree)
         self.add_files(added)
         self.delete_files(deleted)
 
+    def add_files(self, added):
+        """ 按规则处理新增的源文件 """
+        for file_path in added:
+            try:
+                self._process_file(file_path)
+            except OSError as e:
+                self.logger.error(f"Failed to process {file_path}: {e}")
+
+    def delete_files(self, deleted):
+        """ 删除源目录中已不存在的目标文件 """
+        for file_path in deleted:
+            try:
+                self._delete_file(file_path)
+            except OSError as e:
+                self.logger.error(f"Failed to delete {file_path}: {e}")
+
     def parseTree(self, src_tree_list: list, dest_tree_list: list) -> tuple[list, list]:
         """
         解析源目录（src_tree_list）和目标目录（dest_tree_list），
@@ -33,8 +78,10 @@ class Dump:
         """
         added = []  # 新增的文件（需要生成 .strm 文件等）
         deleted = []  # 需要删除的文件
+        src_tree_set = set(src_tree_list)
+        dest_tree_set = set(dest_tree_list)
 
-        # 遍历源目录（src_tree_list），找出新增的文件
+        # 遍历源目录（src_tree_list），找出目标目录中还没有对应文件的源文件
         for src_item in src_tree_list:
             # 获取当前文件的处理方法（根据 rules 中的配置）
             method = self._get_method(src_item)
@@ -42,30 +89,23 @@ class Dump:
             if method == 'ignore':
                 continue  # 忽略该文件，不做处理
             
-            # 如果 method 是 'strm'，则需要生成 .strm 文件
-            if method == 'strm':
-                strm_file = src_item + '.strm'  # 直接生成 .strm 文件名
-                if strm_file not in dest_tree_list:  # 如果目标目录没有该 .strm 文件
-                    added.append(src_item)  # 将源文件加入新增列表，用于创建 .strm 文件
-            else:
-                # 对于其他文件（如 copy, symlink, virtual），直接加入新增列表
+            # strm 方法对应目标目录中的 .strm 文件，其他方法（copy, symlink, virtual）对应同名文件
+            target_item = self._target_rel(src_item) + ('.strm' if method == 'strm' else '')
+            if target_item not in dest_tree_set:
                 added.append(src_item)
 
-        # 遍历目标目录（dest_tree_list），找出需要删除的文件
+        # 遍历目标目录（dest_tree_list），找出源文件已不存在的目标文件
         for dest_item in dest_tree_list:
-            # 获取当前目标文件的处理方法（根据 rules 中的配置）
-            method = self._get_method(dest_item)
+            # 根据对应的源文件获取处理方法
+            source_item = self._source_of(dest_item)
+            method = self._get_method(source_item)
             
             if method == 'ignore':
                 continue  # 忽略该文件，不做处理
+            if (method == 'strm') != dest_item.endswith('.strm'):
+                continue  # 不是按规则生成的文件，不做处理
             
-            # 如果目标目录中是 .strm 文件，检查对应的源文件是否存在
-            if method == 'strm':
-                corresponding_source_file = dest_item.replace('.strm', '')  # 去掉 .strm 后缀，得到源文件路径
-                if corresponding_source_file not in src_tree_list:  # 如果源目录没有对应的文件
-                    deleted.append(dest_item)  # 删除目标目录中的 .strm 文件
-            else:
-                # 删除其他类型的文件（copy, symlink, virtual）
+            if source_item not in src_tree_set:  # 如果源目录没有对应的文件
                 deleted.append(dest_item)
 
         return added, deleted
@@ -105,77 +145,103 @@ class Dump:
 
     def _get_method(self, file_path):
         """ 根据文件的扩展名从任务配置中获取对应的处理方法 """
-        file_extension = os.path.splitext(file_path)[1]
-        for rule in self.task['rules']:
-            if file_extension in rule['extensions']:
-                return rule['method']
-        return 'ignore'  # 默认忽略
+        return get_method(file_path, self.task.get_rules())
+
+    def _target_rel(self, file_path):
+        """ 源文件对应的目标路径（相对 mount_path） """
+        return self.target_root + file_path[len(self.source_root):]
+
+    def _source_of(self, target_item):
+        """ 目标文件（相对 mount_path）对应的源文件路径 """
+        if target_item.endswith('.strm'):
+            target_item = target_item[:-len('.strm')]
+        return self.source_root + target_item[len(self.target_root):]
+
+    def _target_path(self, file_path):
+        """ 源文件对应的目标文件绝对路径 """
+        return os.path.join(self.mount_path, self._target_rel(file_path))
+
+    def _mounted_source(self, file_path):
+        """ 源文件在挂载目录中的绝对路径 """
+        return os.path.join(self.mount_path, file_path.lstrip('/'))
+
+    def _ensure_dir(self, target_path):
+        """ 确保目标目录存在 """
+        target_dir = os.path.dirname(target_path)
+        if not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+    def _on_added(self, target_path):
+        """ 记录新写入的文件：更新目标目录索引和变更日志 """
+        self.changed_dirs.add(os.path.dirname(target_path))
+        if self.target_index is not None:
+            self.target_index.add(target_path)
+
+    def _on_deleted(self, target_path):
+        """ 记录已删除的文件：更新目标目录索引和变更日志 """
+        self.changed_dirs.add(os.path.dirname(target_path))
+        if self.target_index is not None:
+            self.target_index.remove(target_path)
 
     def _create_strm(self, file_path):
         """ 创建 .strm 文件 """
         # 获取协议的前缀
-        attribute = self.task.get('attribute')  # 获取任务中的 attribute 字段，决定使用哪个协议
-        strm_prefix = self.config.get_strm_prefix().get(attribute, "")  # 根据 attribute 获取对应的前缀
+        attribute = get_rule(file_path, self.task.get_rules()).get('attribute')  # 规则的 attribute 字段决定使用哪个协议
+        strm_prefix = self.config.get('strm_prefix', {}).get(attribute, "")  # 根据 attribute 获取对应的前缀
         
         if not strm_prefix:
-            print(f"Error: No strm prefix for attribute {attribute}")
+            self.logger.error(f"No strm prefix for attribute {attribute}")
             return
 
-        strm_path = os.path.join(self.config["mount_path"], file_path + '.strm')
-        strm_url = strm_prefix + file_path
+        strm_path = self._target_path(file_path) + '.strm'
+        self._ensure_dir(strm_path)
+        strm_url = strm_prefix + file_path.lstrip('/')
         with open(strm_path, 'w') as f:
             f.write(strm_url)
-        print(f"Created .strm file for: {file_path}")
+        self._on_added(strm_path)
+        self.logger.info(f"Created .strm file for: {file_path}")
 
     def _copy_file(self, file_path):
         """ 复制文件 """
-        target_path = os.path.join(self.config["mount_path"], file_path)
-        target_dir = os.path.dirname(target_path)
+        target_path = self._target_path(file_path)
+        self._ensure_dir(target_path)
 
-        # 确保目标目录存在
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
-
-        shutil.copy(file_path, target_path)
-        print(f"Copied file: {file_path} to {target_path}")
+        shutil.copy(self._mounted_source(file_path), target_path)
+        self._on_added(target_path)
+        self.logger.info(f"Copied file: {file_path} to {target_path}")
 
     def _create_symlink(self, file_path):
         """ 创建软链接 """
-        target_path = os.path.join(self.config["mount_path"], file_path)
-        target_dir = os.path.dirname(target_path)
+        target_path = self._target_path(file_path)
+        self._ensure_dir(target_path)
 
-        # 确保目标目录存在
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
-
-        os.symlink(file_path, target_path)
-        print(f"Created symlink for: {file_path} to {target_path}")
+        os.symlink(self._mounted_source(file_path), target_path)
+        self._on_added(target_path)
+        self.logger.info(f"Created symlink for: {file_path} to {target_path}")
 
     def _create_virtual_file(self, file_path):
         """ 创建 0KB 虚拟文件 """
-        target_path = os.path.join(self.config["mount_path"], file_path)
-        target_dir = os.path.dirname(target_path)
-
-        # 确保目标目录存在
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
+        target_path = self._target_path(file_path)
+        self._ensure_dir(target_path)
 
         with open(target_path, 'wb') as f:
             pass  # 创建一个空的 0KB 文件
-        print(f"Created virtual file for: {file_path}")
+        self._on_added(target_path)
+        self.logger.info(f"Created virtual file for: {file_path}")
 
     def _delete_file(self, file_path):
-        """ 删除目标文件 """
-        target_path = os.path.join(self.config["mount_path"], file_path)
+        """ 删除目标文件（file_path 为相对 mount_path 的目标路径） """
+        target_path = os.path.join(self.mount_path, file_path)
 
         # 确保目标目录存在，避免删除操作失败
         target_dir = os.path.dirname(target_path)
         if not os.path.exists(target_dir):
-            print(f"Directory {target_dir} does not exist. Skipping deletion for: {file_path}")
+            self.logger.warning(f"Directory {target_dir} does not exist. Skipping deletion for: {file_path}")
             return
 
         if os.path.exists(target_path):
             os.remove(target_path)
-            print(f"Deleted file: {target_path}")
+            self._on_deleted(target_path)
+            self.logger.info(f"Deleted file: {target_path}")
         else:
-            print(f"File not found for deletion: {target_path}")
+            self.logger.warning(f"File not found for deletion: {target_path}")
@@ -0,0 +1,248 @@
+import os
+import threading
+import logging
+
+
+class TargetIndex:
+    def __init__(self, base_dir, root_dir, watch=True, restart_delay=5, dir_rules=None):
+        """
+        常驻内存的目标目录树索引，构建一次后由 Dump 的文件操作和 inotify 事件保持更新，
+        差异比较时直接读取内存，不再遍历文件系统
+
+        :param base_dir: 基础路径（mount_path），索引中的路径都相对于该路径
+        :param root_dir: 需要索引的目标目录
+        :param watch: 是否启动 inotify 监听外部修改（需要安装 inotify_simple）
+        :param restart_delay: 监听线程异常退出后重启前的等待秒数
+        :param dir_rules: 目录排除规则（DirRules），被排除的子树不建立索引也不添加监听
+        """
+        self.base_dir = base_dir
+        self.root_dir = root_dir
+        self.restart_delay = restart_delay
+        self.dir_rules = dir_rules
+        self.children = {}  # 目录相对路径 -> 子项名称集合
+        self.lock = threading.Lock()
+        self._ready = threading.Event()  # 首次全量扫描完成
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None  # 监听线程运行时的 INotify 实例
+        self._watches = {}  # wd -> 目录绝对路径
+        self._ancestor = None  # 目标目录不存在时监听的 (wd, 最近的已存在上级目录)
+        if watch and self._inotify_available():
+            self._thread = threading.Thread(target=self._watch_loop, name=f"index:{root_dir}", daemon=True)
+            self._thread.start()
+        else:
+            self.rescan()
+
+    def snapshot(self, dir_rules=None):
+        """
+        返回目标目录树（路径列表），格式与 Tree.get_target_tree 相同
+
+        :param dir_rules: 目录排除规则（DirRules），被排除的子树不会出现在结果中
+        """
+        self._ready.wait()
+        with self.lock:
+            tree = []
+            stack = [(self._rel(self.root_dir), '')]  # (索引中的路径, 相对任务目标目录的路径)
+            while stack:
+                rel_dir, task_dir = stack.pop()
+                for name in self.children.get(rel_dir, ()):
+                    task_path = "{0}/{1}".format(task_dir, name) if task_dir else name
+                    rel = os.path.join(rel_dir, name)
+                    is_dir = rel in self.children
+                    # 规则只作用于目录，同名的文件不受影响
+                    if is_dir and dir_rules and dir_rules.is_excluded(name, task_path):
+                        continue
+                    tree.append(rel)
+                    if is_dir:
+                        stack.append((rel, task_path))
+            return tree
+
+    def add(self, path):
+        """记录新增的文件或目录（绝对路径），同时补全其上级目录"""
+        rel = self._rel(path)
+        if rel is None:
+            return
+        with self.lock:
+            self._add(rel, os.path.isdir(path))
+
+    def remove(self, path):
+        """记录删除的文件或目录（绝对路径），目录会连同其下所有子项一起移除"""
+        rel = self._rel(path)
+        if rel is None:
+            return
+        with self.lock:
+            self._remove(rel)
+
+    def rescan(self):
+        """全量扫描目标目录，重建索引"""
+        children = {}
+        if self._inotify is not None and not os.path.isdir(self.root_dir):
+            self._watch_ancestor()
+        for dirpath, dirnames, filenames in os.walk(self.root_dir):
+            if self.dir_rules:
+                dirnames[:] = [name for name in dirnames if not self._is_excluded(dirpath, name)]
+            if self._inotify is not None:
+                # 先添加监听再列目录，避免遗漏扫描期间的修改
+                self._add_watch(dirpath)
+            children[self._rel(dirpath)] = set(dirnames) | set(filenames)
+        with self.lock:
+            self.children = children
+        self._ready.set()
+
+    def stop(self):
+        """停止 inotify 监听"""
+        self._stop.set()
+
+    def _rel(self, path):
+        """转换为相对于 base_dir 的路径，不在 root_dir 下的路径返回 None"""
+        path = os.path.normpath(path)
+        if path != self.root_dir and not path.startswith(self.root_dir.rstrip(os.sep) + os.sep):
+            return None
+        rel = os.path.relpath(path, self.base_dir)
+        return '' if rel == '.' else rel
+
+    def _is_excluded(self, dirpath, name):
+        """判断目录是否被 dir_rules 排除"""
+        rel_path = os.path.relpath(os.path.join(dirpath, name), self.root_dir).replace(os.sep, '/')
+        return self.dir_rules.is_excluded(name, rel_path)
+
+    def _add(self, rel, is_dir):
+        root = self._rel(self.root_dir)
+        if is_dir:
+            self.children.setdefault(rel, set())
+        while rel != root:
+            parent, name = os.path.split(rel)
+            siblings = self.children.setdefault(parent, set())
+            if name in siblings:
+                break  # 上级目录已在索引中
+            siblings.add(name)
+            rel = parent
+
+    def _remove(self, rel):
+        if rel == self._rel(self.root_dir):
+            self.children = {}
+            return
+        parent, name = os.path.split(rel)
+        self.children.get(parent, set()).discard(name)
+        prefix = rel + os.sep
+        for key in [key for key in self.children if key == rel or key.startswith(prefix)]:
+            del self.children[key]
+
+    # inotify 监听
+    def _inotify_available(self):
+        try:
+            import inotify_simple  # noqa: F401
+            return True
+        except ImportError:
+            logging.warning("inotify_simple is not installed, target index only tracks changes made by this app")
+            return False
+
+    def _add_watch(self, dirpath):
+        from inotify_simple import flags
+        mask = (flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.MOVED_TO
+                | flags.DELETE_SELF | flags.MOVE_SELF)
+        try:
+            wd = self._inotify.add_watch(dirpath, mask)
+        except OSError as e:
+            logging.warning(f"Failed to watch {dirpath}: {e}")
+            return
+        self._watches[wd] = dirpath
+
+    def _watch_ancestor(self):
+        """目标目录尚不存在时监听最近的已存在上级目录，目标目录被创建后重新扫描"""
+        from inotify_simple import flags
+        ancestor = os.path.dirname(self.root_dir)
+        while not os.path.isdir(ancestor) and ancestor != os.path.dirname(ancestor):
+            ancestor = os.path.dirname(ancestor)
+        try:
+            self._ancestor = (self._inotify.add_watch(ancestor, flags.CREATE | flags.MOVED_TO), ancestor)
+        except OSError as e:
+            logging.warning(f"Failed to watch {ancestor}: {e}")
+
+    def _watch_loop(self):
+        """监听线程：异常退出或 inotify 队列溢出后重新建立监听并全量扫描"""
+        while not self._stop.is_set():
+            try:
+                self._watch()
+            except Exception as e:
+                logging.warning(f"Target index watcher for {self.root_dir} stopped: {e}, restarting")
+                if not self._ready.is_set():
+                    self.rescan()  # 监听无法建立时先提供一份全量扫描结果
+                self._stop.wait(self.restart_delay)
+
+    def _watch(self):
+        from inotify_simple import INotify, flags
+        self._inotify = INotify()
+        self._watches = {}
+        self._ancestor = None
+        try:
+            self.rescan()
+            while not self._stop.is_set():
+                for event in self._inotify.read(timeout=1000):
+                    if event.mask & flags.Q_OVERFLOW:
+                        logging.warning(f"inotify queue overflow on {self.root_dir}, rescanning")
+                        return
+                    if self._on_event(event, flags):
+                        return  # 目标目录被创建、删除或移走，重新扫描
+        finally:
+            self._inotify.close()
+            self._inotify = None
+
+    def _on_event(self, event, flags):
+        """处理一个 inotify 事件，需要重新扫描时返回 True"""
+        if self._ancestor is not None and event.wd == self._ancestor[0]:
+            path = os.path.join(self._ancestor[1], event.name)
+            return path == self.root_dir or self.root_dir.startswith(path + os.sep)
+        dirpath = self._watches.get(event.wd)
+        if dirpath is None:
+            return
+        if event.mask & flags.IGNORED:
+            self._watches.pop(event.wd, None)
+            return
+        if event.mask & (flags.DELETE_SELF | flags.MOVE_SELF):
+            if dirpath == self.root_dir:
+                return True  # 目标目录被删除或移走，重新扫描并监听上级目录，等待其重新创建
+            self.remove(dirpath)
+            return
+        path = os.path.join(dirpath, event.name)
+        if event.mask & (flags.DELETE | flags.MOVED_FROM):
+            self.remove(path)
+        elif event.mask & (flags.CREATE | flags.MOVED_TO):
+            if event.mask & flags.ISDIR:
+                if self.dir_rules and self._is_excluded(dirpath, event.name):
+                    return
+                # 新目录：添加监听并补扫其子树（可能是整体移动进来的目录）
+                for sub_dirpath, dirnames, filenames in os.walk(path):
+                    if self.dir_rules:
+                        dirnames[:] = [name for name in dirnames if not self._is_excluded(sub_dirpath, name)]
+                    self._add_watch(sub_dirpath)
+                    for name in dirnames + filenames:
+                        self.add(os.path.join(sub_dirpath, name))
+            self.add(path)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_target_index(base_dir, root_dir, watch=True, dir_rules=None):
+    """
+    获取目标目录的常驻索引，同一目录在进程内只构建一次
+
+    :param dir_rules: 目录排除规则，规则变化后停止原索引并重新构建，使不再排除的子树进入索引
+    """
+    root_dir = os.path.normpath(root_dir)
+    with _indexes_lock:
+        index = _indexes.get(root_dir)
+        if index is not None and _rules_key(index.dir_rules) != _rules_key(dir_rules):
+            index.stop()
+            index = None
+        if index is None:
+            index = TargetIndex(os.path.normpath(base_dir), root_dir, watch=watch, dir_rules=dir_rules)
+            _indexes[root_dir] = index
+        return index
+
+
+def _rules_key(dir_rules):
+    """用于比较两组目录规则是否相同，空规则与未设置规则相同"""
+    return (tuple(dir_rules.exclude), tuple(dir_rules.include)) if dir_rules else None
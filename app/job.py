@@ -1,53 +1,47 @@
 import conn
 import tree
 import dump
+import index
+import notify
+import parallel
 import task
+import config
 import json
 from datetime import datetime
 import threading
-import logging
-from app.util import SocketIOHandler
+from util import SocketIOHandler, setup_job_logger, close_job_logger, job_log_path
 import os
 
 class Job:
-    def __init__(self, task):
+    def __init__(self, task, socketio=None):
         """
         初始化 Job 实例
         
         :param task: 任务实例（Task 类实例），包含任务配置和规则
+        :param socketio: SocketIO 实例，传入时日志会实时推送到 WebSocket
         """
         self.task = task  # 传入的 Task 类实例，包含任务的配置和规则
+        self.socketio = socketio
         self.timestamp = datetime.now().strftime('%Y%m%d%H%M%S')  # 生成时间戳
         self.name = f"{self.task.get_name()}_{self.timestamp}"  # 使用 task name 和时间戳来生成 Job 名称
         self.status = 'pending'  # 任务的初始状态
-        self.logs = []  # 日志记录
-        self.conn = conn.Conn()  # 初始化连接实例
-        self.tree = tree.Tree()  # 初始化目录树实例
-        self.dump = dump.Dump()  # 初始化 dump 实例
+        self.conn = None  # 连接实例，任务启动时创建
+        self.tree = None  # 目录树实例，任务启动时创建
+        self.dump = None  # dump 实例，获取目录树后创建
+        self.target_index = None  # 常驻目标目录索引（任务启用 enable_target_index 时使用）
         self.start_time = None  # 任务开始时间
         self.end_time = None  # 任务结束时间
         self.lock = threading.Lock()  # 创建一个锁对象，用于线程同步
-        self.logger = self._setup_logger()  # 初始化 logger
-        self.job_data = self._load_job_data()  # 载入已有的 job 数据
+        self.logger, self.logs = self._setup_logger()  # 初始化 logger，logs 为最近日志的环形缓冲区
+        self.job_data = None  # 已有的 job 数据，任务启动时载入
 
     def _setup_logger(self):
-        """为每个 Job 设置独立的日志文件，并同时发送到 WebSocket"""
-        logger = logging.getLogger(self.name)
-        log_filename = f"logs/{self.name}.log"  # 使用 job name 作为日志文件名
-        
-        # 日志文件处理器
-        file_handler = logging.FileHandler(log_filename)
-        formatter = logging.Formatter('%(asctime)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        
-        # SocketIO 处理器
-        socketio_handler = SocketIOHandler(self.socketio, self.name)
-        socketio_handler.setFormatter(formatter)
-        
-        logger.addHandler(file_handler)  # 将日志记录到文件
-        logger.addHandler(socketio_handler)  # 将日志实时推送到 WebSocket
-        logger.setLevel(logging.INFO)
-        return logger
+        """为每个 Job 设置独立的日志文件，并同时发送到 WebSocket；内存中只保留最近的日志"""
+        buffer_size = config.Config().get_logging_buffer_size()
+        handlers = []
+        if self.socketio is not None:
+            handlers.append(SocketIOHandler(self.socketio, self.name))  # 将日志实时推送到 WebSocket
+        return setup_job_logger(self.name, buffer_size, handlers=handlers)
     
     def _load_job_data(self):
         """加载 job.json 文件，获取已有的任务数据"""
@@ -64,6 +58,11 @@ class Job:
         with open(job_file_path, 'w') as f:
             json.dump(self.job_data, f, indent=4)
 
+    def _log_size(self):
+        """获取当前日志文件大小"""
+        path = job_log_path(self.name)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
     def start(self):
         """
         启动任务
@@ -73,11 +72,13 @@ class Job:
         """
         self.start_time = datetime.now()  # 记录任务开始时间
         self.status = 'running'  # 设置任务状态为运行中
-        self.logs.append(f"Job {self.name} started at {self.start_time}.")
+        self.job_data = self._load_job_data()  # 载入已有的 job 数据
+        self.logger.info(f"Job {self.name} started at {self.start_time}.")
         
         # 记录任务开始信息到 job.json
         job_info = {
             "name": self.name,
+            "task": self.task.get_name(),
             "status": "running",
             "start_time": self.start_time.isoformat(),
             "result": {"success": 0, "failed": 0, "cleaned": 0}
@@ -87,15 +88,38 @@ class Job:
 
         try:
             # 获取 client
+            self.conn = conn.Conn()
+            self.tree = tree.Tree()
             client = self.conn.get_client()
             
             # 获取源目录树和目标目录树
+            workers = self.task.get_parallel_workers()
+            changes = None
             with self.lock:  # 确保获取树的过程中不会有其他任务干扰
-                source_tree = self.tree.get_source_tree(client, self.task.get_source_path())
-                target_tree = self.tree.get_target_tree(self.task.get_target_path())
+                dir_rules = self._get_dir_rules()
+                target_tree = self._get_target_tree(dir_rules)
+                if workers > 1:
+                    # 并行模式：按顶层目录分区，在进程池中拼接路径、分类并比较差异
+                    root_path, partitions = self.tree.get_source_partitions(client, self.task.get_source_path())
+                    mount_path, target_dir = self._get_target_dir()
+                    changes = parallel.diff(root_path, partitions, target_tree, os.path.relpath(target_dir, mount_path),
+                                            self.task.get_rules(), dir_rules, workers)
+                    source_tree = None
+                else:
+                    source_tree = self.tree.get_source_tree(client, self.task.get_source_path(), dir_rules)
             
-            # 执行增量同步（dump）
-            self.dump.run(source_tree, target_tree, self.task)
+            # 执行增量同步（dump），文件级日志写入 job 日志，文件操作同步更新目标目录索引
+            self.dump = dump.Dump(source_tree, target_tree, self.task, logger=self.logger,
+                                  target_index=self.target_index)
+            self.dump.run(changes)
+
+            # 通知媒体服务器只刷新变更的目录，通知失败不影响任务结果
+            try:
+                notifier = notify.get_notifier(config.Config().get_media_server())
+                if notifier is not None:
+                    notifier.notify(self.dump.changed_dirs, root=self._get_target_dir()[1])
+            except Exception as e:
+                self.logger.error(f"Failed to schedule media server refresh: {e}")
             
             # 标记任务完成
             self.complete()
@@ -103,11 +127,29 @@ class Job:
         except Exception as e:
             self.fail(f"Job failed with error: {str(e)}")
 
+    def _get_dir_rules(self):
+        """根据任务配置创建目录排除/包含规则"""
+        rules = self.task.get_dir_rules()
+        return tree.DirRules(rules.get('exclude', []), rules.get('include', []))
+
+    def _get_target_dir(self):
+        """获取 (mount_path, 任务目标目录)"""
+        mount_path = config.Config().get_mount_path()
+        return mount_path, os.path.join(mount_path, self.task.get_target_path().lstrip('/'))
+
+    def _get_target_tree(self, dir_rules=None):
+        """获取目标目录树：启用索引时直接读取内存中的索引，否则遍历目标目录"""
+        mount_path, target_dir = self._get_target_dir()
+        if self.task.get_enable_target_index():
+            self.target_index = index.get_target_index(mount_path, target_dir, dir_rules=dir_rules)
+            return self.target_index.snapshot(dir_rules)
+        return self.tree.get_target_tree(mount_path, target_dir, [], dir_rules)
+
     def complete(self):
         """标记任务为完成，并记录日志"""
         self.end_time = datetime.now()  # 记录任务结束时间
         self.status = 'completed'  # 设置任务状态为已完成
-        self.logs.append(f"Job {self.name} completed at {self.end_time}. Duration: {self.end_time - self.start_time}")
+        self.logger.info(f"Job {self.name} completed at {self.end_time}. Duration: {self.end_time - self.start_time}")
 
         # 更新 job.json 中的任务信息
         for job in self.job_data['jobs']:
@@ -115,12 +157,14 @@ class Job:
                 job['status'] = 'completed'
                 job['end_time'] = self.end_time.isoformat()
                 job['result'] = {"success": 120, "failed": 5, "cleaned": 8}  # 假设的结果
+                job['log_size'] = self._log_size()  # 供 LogCleaner 按总大小清理，无需再 stat 日志文件
         self._save_job_data()  # 保存更新后的任务数据
+        close_job_logger(self.logger)  # 完整日志已写入文件，内存中只保留 logs
 
     def fail(self, reason):
         """任务失败时的处理"""
         self.status = 'failed'  # 设置任务状态为失败
-        self.logs.append(f"Job {self.name} failed: {reason}")
+        self.logger.error(f"Job {self.name} failed: {reason}")
 
         # 更新 job.json 中的任务信息
         for job in self.job_data['jobs']:
@@ -128,12 +172,14 @@ class Job:
                 job['status'] = 'failed'
                 job['end_time'] = datetime.now().isoformat()
                 job['result'] = {"success": 0, "failed": 0, "cleaned": 0}  # 假设的结果
+                job['log_size'] = self._log_size()
         self._save_job_data()  # 保存更新后的任务数据
+        close_job_logger(self.logger)  # 完整日志已写入文件，内存中只保留 logs
 
     def update_logs(self, message):
         """更新日志"""
-        self.logs.append(message)
+        self.logger.info(message)
 
     def get_logs(self):
-        """获取日志"""
+        """获取最近的日志，完整日志见日志文件"""
         return '\n'.join(self.logs)
@@ -1,11 +1,12 @@
 import os
 import json
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, make_response
 from flask_socketio import SocketIO, emit
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
 import threading
+from util import (setup_job_logger, close_job_logger, read_job_log, job_log_etag, job_log_path, is_valid_job_name,
+                  LOG_LEVELS)
+import config
 
 # app = Flask(__name__)
 app = Flask(__name__, template_folder="../web")  # 指定web文件夹
@@ -16,6 +17,8 @@ TASKS_FILE = "config/task.json"
 CONFIG_FILE = "config/config.json"
 LOGS_FOLDER = "logs"
 JOB_FILE = "cache/job.json"
+LOGS_PAGE_SIZE = 200
+LOGS_PAGE_MAX = 1000
 
 # 加载任务数据
 def load_tasks():
@@ -48,19 +51,21 @@ def start_job(task_name):
 class Job:
     def __init__(self, name, task):
         self.name = f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}"  # Job name includes timestamp
+        self.task_name = name
         self.task = task
         self.status = "pending"
         self.start_time = None
         self.end_time = None
-        self.logs = []
         self.result = {"success": 0, "failed": 0, "cleaned": 0}
         self.lock = threading.Lock()
+        buffer_size = load_config().get('logging', {}).get('buffer_size', 1000)
+        self.logger, self.logs = setup_job_logger(self.name, buffer_size)  # logs 只保留最近的日志，完整日志见日志文件
 
     def start(self):
         """启动任务"""
         self.start_time = datetime.now()
         self.status = "running"
-        self.logs.append(f"Job {self.name} started at {self.start_time}.")
+        self.logger.info(f"Job {self.name} started at {self.start_time}.")
         # 模拟执行任务
         try:
             # 任务模拟操作
@@ -70,13 +75,15 @@ class Job:
             self.result['cleaned'] = 8
             self.end_time = datetime.now()
             self.status = "completed"
-            self.logs.append(f"Job {self.name} completed at {self.end_time}. Duration: {self.end_time - self.start_time}")
+            self.logger.info(f"Job {self.name} completed at {self.end_time}. Duration: {self.end_time - self.start_time}")
             # 记录到jobs.json
             self.save_job_result()
         except Exception as e:
             self.status = "failed"
-            self.logs.append(f"Job {self.name} failed with error: {str(e)}")
+            self.logger.error(f"Job {self.name} failed with error: {str(e)}")
             self.save_job_result()
+        finally:
+            close_job_logger(self.logger)  # 完整日志已写入文件，内存中只保留 logs
 
     def save_job_result(self):
         """将任务运行结果保存到job.json"""
@@ -89,10 +96,12 @@ class Job:
 
         job_data = {
             "name": self.name,
+            "task": self.task_name,
             "status": self.status,
             "start_time": self.start_time.isoformat(),
             "end_time": self.end_time.isoformat() if self.end_time else None,
-            "result": self.result
+            "result": self.result,
+            "log_size": os.path.getsize(job_log_path(self.name))  # 供 LogCleaner 按总大小清理
         }
 
         data['jobs'].append(job_data)
@@ -100,6 +109,11 @@ class Job:
         with open(JOB_FILE, 'w') as f:
             json.dump(data, f, indent=4)
 
+# 健康检查：不读取任何文件，也不导入任务相关的模块
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"})
+
 # 任务管理
 @app.route('/')
 def index():
@@ -134,14 +148,47 @@ def api_create_task():
 
 @app.route('/api/logs', methods=['GET'])
 def api_get_logs():
+    """
+    查询 job 记录和日志
+    - 不带 job_name：按 cursor（上一页返回的 next_cursor）和 limit 分页返回 job 记录，按 start_time 排序
+    - 带 job_name：返回 job 记录，以及从 offset（字节偏移）开始的最多 limit 行日志，
+      可用 level 过滤最低日志级别；下一次轮询以返回的 next_offset 作为 offset
+    日志文件和 job.json 都没有变化时，If-None-Match 命中 ETag 直接返回 304，不读取任何文件
+    """
     job_name = request.args.get('job_name')
-    logs = []
+    limit = min(max(request.args.get('limit', LOGS_PAGE_SIZE, type=int), 1), LOGS_PAGE_MAX)
+    if not job_name:
+        # 以上一页最后一条记录的 start_time 作为游标，LogCleaner 删除记录后分页不会错位
+        cursor = request.args.get('cursor', '')
+        with open(JOB_FILE, 'r') as f:
+            jobs = sorted((job for job in json.load(f)['jobs'] if job['start_time'] > cursor),
+                          key=lambda job: job['start_time'])
+        next_cursor = jobs[limit - 1]['start_time'] if len(jobs) > limit else None
+        return jsonify({"jobs": jobs[:limit], "next_cursor": next_cursor})
+
+    if not is_valid_job_name(job_name):
+        return jsonify({"status": "failure", "message": f"Invalid job name: {job_name}"}), 400
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    level = request.args.get('level')
+    if level and level.upper() not in LOG_LEVELS:
+        return jsonify({"status": "failure", "message": f"Unknown log level: {level}"}), 400
+
+    etag = job_log_etag(job_name, offset, limit, level)
+    if etag and etag in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    jobs = []
     with open(JOB_FILE, 'r') as f:
         data = json.load(f)
         for job in data['jobs']:
             if job['name'] == job_name:
-                logs.append(job)
-    return jsonify(logs)
+                jobs.append(job)
+    response = make_response(jsonify({"jobs": jobs, "logs": read_job_log(job_name, offset, limit, level)}))
+    if etag:
+        response.set_etag(etag)
+    return response
 
 @app.route('/api/global_settings', methods=['GET', 'POST'])
 def api_global_settings():
@@ -174,5 +221,17 @@ def handle_log_request(data):
             if job['name'] == job_name:
                 emit('log_update', {'task_name': job_name, 'logs': job['result']})
 
+def start_log_cleaner():
+    """按全局配置启动日志清理器"""
+    from util import LogCleaner
+    cfg = config.Config(CONFIG_FILE, TASKS_FILE)
+    return LogCleaner(
+        cfg.get_logging_retention_days(),
+        task_retention_days=cfg.get_logging_task_retention_days(),
+        max_total_size_mb=cfg.get_logging_max_total_size_mb(),
+        compress_after_days=cfg.get_logging_compress_after_days(),
+        compression=cfg.get_logging_compression())
+
 if __name__ == "__main__":
+    start_log_cleaner()
     socketio.run(app, debug=True)
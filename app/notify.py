@@ -0,0 +1,150 @@
+import os
+import threading
+import logging
+import time
+
+
+class LibraryNotifier:
+    def __init__(self, url, api_key='', debounce_seconds=30, max_delay_seconds=300, path_map=None, max_paths=50,
+                 batch_size=20, timeout=10):
+        """
+        媒体服务器媒体库刷新通知：合并各个 job 变更的目录，防抖后按路径批量通知，
+        让媒体服务器只扫描变更的目录，而不是整个媒体库（Emby/Jellyfin 的 /Library/Media/Updated 接口）
+
+        :param url: 媒体服务器地址，如 http://192.168.1.71:8096
+        :param api_key: 媒体服务器 API Key
+        :param debounce_seconds: 最后一次变更后等待多少秒再发送通知，期间的变更合并到同一批
+        :param max_delay_seconds: 第一次变更后最多等待多少秒，连续的 job 不会无限推迟通知
+        :param path_map: 本地路径前缀到媒体服务器路径前缀的映射，如 {"/volume1/cloud/115": "/media"}
+        :param max_paths: 每次通知的最多目录数，超出时逐级合并到上级目录，但不会合并到任务目标目录或 path_map 前缀
+                          （相当于刷新整个媒体库），仍超出时分成更多批发送
+        :param batch_size: 每个请求包含的目录数
+        :param timeout: 请求超时秒数
+        """
+        self.url = url.rstrip('/')
+        self.api_key = api_key
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.path_map = path_map or {}
+        self.roots = {os.path.normpath(prefix) for prefix in self.path_map}  # 合并目录时不能超出的上级目录
+        self.max_paths = max_paths
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.pending = set()  # 等待通知的目录
+        self._deadline = None  # 本批通知最晚的发送时间
+        self.lock = threading.Lock()
+        self._timer = None
+
+    def notify(self, dirs, root=None):
+        """
+        记录变更的目录，并重新开始防抖计时（不超过本批的最晚发送时间）
+
+        :param root: 任务目标目录，变更的目录不会合并到该目录或其上级目录
+        """
+        if not dirs:
+            return
+        with self.lock:
+            if root:
+                self.roots.add(os.path.normpath(root))
+            now = time.monotonic()
+            if self._deadline is None:
+                self._deadline = now + self.max_delay_seconds
+            self.pending.update(dirs)
+            if self._timer is not None:
+                self._timer.cancel()
+            delay = max(0, min(self.debounce_seconds, self._deadline - now))
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """立即发送所有等待中的通知"""
+        with self.lock:
+            dirs, self.pending = self.pending, set()
+            self._timer = None
+            self._deadline = None
+            roots = set(self.roots)
+        paths = [self._map_path(path) for path in coalesce_dirs(dirs, self.max_paths, roots)]
+        for i in range(0, len(paths), self.batch_size):
+            self._send(paths[i:i + self.batch_size])
+
+    def _map_path(self, path):
+        """将本地路径转换为媒体服务器中的路径"""
+        for local_prefix, server_prefix in self.path_map.items():
+            if path == local_prefix or path.startswith(local_prefix.rstrip('/') + '/'):
+                return server_prefix.rstrip('/') + path[len(local_prefix.rstrip('/')):]
+        return path
+
+    def _send(self, paths):
+        """发送一次按路径刷新的请求，失败只记录日志，不影响同步任务"""
+        import requests  # 只有配置了媒体服务器时才需要
+        payload = {"Updates": [{"Path": path, "UpdateType": "Modified"} for path in paths]}
+        try:
+            response = requests.post(f"{self.url}/Library/Media/Updated", json=payload,
+                                     headers={"X-Emby-Token": self.api_key}, timeout=self.timeout)
+            response.raise_for_status()
+            logging.info(f"Notified media server to refresh {len(paths)} paths")
+        except requests.RequestException as e:
+            logging.error(f"Failed to notify media server: {e}")
+
+
+def coalesce_dirs(dirs, max_paths=None, roots=None):
+    """
+    将目录集合合并为最小的上级目录集合：去掉已被其他目录包含的子目录，
+    数量仍超过 max_paths 时把最深的目录替换为其上级目录，直到不超过 max_paths
+
+    :param roots: 任务目标目录和 path_map 前缀，目录只在其所属的最近的 root 之下向上合并，不会合并为 root 本身，
+                  不属于任何 root 的目录不合并；为空时最多合并到第一级目录
+    """
+    roots = [os.path.normpath(root) for root in roots or ()]
+    dirs = _drop_nested({os.path.normpath(path) for path in dirs})
+    while max_paths and len(dirs) > max_paths:
+        movable = [path for path in dirs if _can_move_up(path, roots)]
+        if not movable:
+            break  # 已合并到各个 root，由调用方分成更多批发送
+        deepest = max(path.count(os.sep) for path in movable)
+        lifted = {path for path in movable if path.count(os.sep) == deepest}
+        dirs = _drop_nested({os.path.dirname(path) if path in lifted else path for path in dirs})
+    return dirs
+
+
+def _can_move_up(path, roots):
+    """目录能否替换为其上级目录：有 roots 时上级目录仍须在所属的最近的 root 之下"""
+    if not roots:
+        return path.count(os.sep) > 1
+    parent = os.path.dirname(path)
+    containing = [root for root in roots if path == root or path.startswith(root.rstrip(os.sep) + os.sep)]
+    return bool(containing) and parent.startswith(max(containing, key=len).rstrip(os.sep) + os.sep)
+
+
+def _drop_nested(dirs):
+    """去掉被集合中其他目录包含的目录，返回排序后的列表"""
+    result = []
+    for path in sorted(dirs, key=lambda path: path.split(os.sep)):
+        if result and (path == result[-1] or path.startswith(result[-1].rstrip(os.sep) + os.sep)):
+            continue
+        result.append(path)
+    return result
+
+
+# media_server 配置中传给 LibraryNotifier 的键，其他键（如 enabled）忽略
+NOTIFIER_OPTIONS = ('api_key', 'debounce_seconds', 'max_delay_seconds', 'path_map', 'max_paths', 'batch_size', 'timeout')
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier(settings):
+    """
+    获取进程内共享的通知器，使多个 job 的变更在同一个防抖窗口内合并
+
+    :param settings: 全局配置中的 media_server 配置，未配置 url 或 enabled 为 false 时返回 None
+    """
+    global _notifier
+    if not settings or not settings.get('url') or not settings.get('enabled', True):
+        return None
+    with _notifier_lock:
+        if _notifier is None:
+            options = {key: settings[key] for key in NOTIFIER_OPTIONS if key in settings}
+            _notifier = LibraryNotifier(settings['url'], **options)
+        return _notifier
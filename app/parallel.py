@@ -0,0 +1,188 @@
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import dump
+
+# 工作进程返回的操作码
+OP_ADD = 0
+OP_DELETE = 1
+
+
+class Partition:
+    def __init__(self):
+        """
+        源目录下一个顶层目录（或顶层文件）的子树，只保存名称和父节点下标，不拼接路径
+
+        names[i] 为第 i 个条目的名称，parents[i] 为其父条目在本分区中的下标（-1 表示父目录是任务根目录）
+        """
+        self.names = []
+        self.parents = array('i')
+
+
+def partition_export(items, path):
+    """
+    将导出目录树的条目按顶层目录分区
+
+    :param items: 导出目录树的条目（parse_export_dir_as_dict_iter 的结果）
+    :param path: 任务源路径
+    :return: (任务根目录路径, {顶层名称: Partition})
+    """
+    root_path = path
+    source_key = None
+    located = {}  # key -> (分区, 分区内下标)
+    partitions = {}
+    i = 0
+    for item in items:
+        i += 1
+        if i == 1:
+            continue
+        if i == 2:
+            source_key = item['key']
+            if not path.endswith(item['name']):
+                root_path = "/{0}".format(item['name'])
+            continue
+        if item['parent_key'] == source_key:
+            partition = partitions.setdefault(item['name'], Partition())
+            parent = -1
+        else:
+            found = located.get(item['parent_key'])
+            if found is None:
+                continue  # 不在任务源目录下的条目
+            partition, parent = found
+        located[item['key']] = (partition, len(partition.names))
+        partition.names.append(item['name'])
+        partition.parents.append(parent)
+    return root_path, partitions
+
+
+def diff(root_path, partitions, target_tree, target_prefix, rules, dir_rules=None, workers=os.cpu_count()):
+    """
+    用进程池对各分区并行拼接路径、按规则分类并与对应的目标目录切片比较，结果与 Dump.parseTree 一致
+
+    工作进程只返回条目下标数组和操作码，主进程只为需要处理的条目拼接路径
+
+    :param root_path: 任务根目录路径（partition_export 的返回值）
+    :param partitions: {顶层名称: Partition}
+    :param target_tree: 目标目录树（相对 mount_path 的路径列表）
+    :param target_prefix: 任务目标目录相对 mount_path 的路径
+    :param rules: 任务规则
+    :param dir_rules: 目录排除/包含规则（DirRules）
+    :param workers: 工作进程数，1 表示在当前进程中执行
+    :return: (added, deleted)
+    """
+    target_slices = {}
+    prefix_len = len(target_prefix) + 1
+    for target_path in target_tree:
+        parts = target_path[prefix_len:].split(os.sep, 1)
+        top = parts[0]
+        if len(parts) == 1 and top.endswith('.strm'):
+            top = top[:-len('.strm')]  # 顶层 .strm 文件与其源文件在同一分区
+        target_slices.setdefault(top, []).append(target_path)
+
+    tops = list(partitions.keys() | target_slices.keys())
+    jobs = [(partitions[top].names if top in partitions else [],
+             partitions[top].parents if top in partitions else array('i'),
+             target_slices.get(top, [])) for top in tops]
+    batches = _balance(jobs, workers * 4)
+
+    if workers <= 1:
+        results = [_diff_batch(root_path, target_prefix, batch, rules, dir_rules) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_diff_batch, root_path, target_prefix, batch, rules, dir_rules)
+                       for batch in batches]
+            results = [future.result() for future in futures]
+
+    added, deleted = [], []
+    # 任务根目录本身也是源目录树中的一项，按与 Dump.parseTree 相同的规则处理
+    method = dump.get_method(root_path, rules)
+    if method != 'ignore' and target_prefix + ('.strm' if method == 'strm' else '') not in target_tree:
+        added.append(root_path.replace('/', os.sep))
+    for batch, batch_results in zip(batches, results):
+        for (names, parents, target_paths), (ids, ops) in zip(batch, batch_results):
+            dirs = {}  # 分区内已拼接的目录路径
+            for i, op in zip(ids, ops):
+                if op == OP_ADD:
+                    added.append(_build_path(root_path, names, parents, i, dirs).replace('/', os.sep))
+                else:
+                    deleted.append(target_paths[i])
+    return added, deleted
+
+
+def _balance(jobs, count):
+    """按条目数把分区均衡地分成最多 count 批，减少提交到进程池的任务数"""
+    batches = [[] for _ in range(max(1, min(count, len(jobs))))]
+    sizes = [0] * len(batches)
+    for job in sorted(jobs, key=lambda job: len(job[0]) + len(job[2]), reverse=True):
+        smallest = sizes.index(min(sizes))
+        batches[smallest].append(job)
+        sizes[smallest] += len(job[0]) + len(job[2])
+    return batches
+
+
+def _build_path(root_path, names, parents, i, dirs):
+    """根据父节点下标拼接第 i 个条目的路径"""
+    parent = parents[i]
+    if parent < 0:
+        base = root_path
+    else:
+        base = dirs.get(parent)
+        if base is None:
+            base = dirs[parent] = _build_path(root_path, names, parents, parent, dirs)
+    return "{0}/{1}".format(base, names[i])
+
+
+def _diff_batch(root_path, target_prefix, batch, rules, dir_rules):
+    """工作进程：处理一批分区，每个分区返回 (条目下标 array, 操作码 bytes)"""
+    return [_diff_partition(root_path, target_prefix, names, parents, target_paths, rules, dir_rules)
+            for names, parents, target_paths in batch]
+
+
+def _diff_partition(root_path, target_prefix, names, parents, target_paths, rules, dir_rules):
+    """源路径与目标路径的对应关系与 Dump._target_rel / Dump._source_of 相同"""
+    root_len = len(root_path) + 1
+    paths = [None] * len(names)
+    checked = bytearray(len(names))  # 已按 dir_rules 判断过的目录
+    for i, name in enumerate(names):
+        parent = parents[i]
+        if parent < 0:
+            base = root_path
+        else:
+            base = paths[parent]
+            if base is None:
+                continue  # 父目录已被剪枝
+            if dir_rules and not checked[parent]:
+                # 条目第一次作为父目录出现时才知道它是目录，此时按规则判断
+                checked[parent] = 1
+                if dir_rules.is_excluded(names[parent], base[root_len:]):
+                    paths[parent] = None
+                    continue
+        paths[i] = "{0}/{1}".format(base, name)
+
+    source_set = set(path for path in paths if path is not None)
+    target_set = set(target_paths)
+    ids = array('I')
+    ops = bytearray()
+    for i, path in enumerate(paths):
+        if path is None:
+            continue
+        method = dump.get_method(path, rules)
+        if method == 'ignore':
+            continue
+        if target_prefix + path[len(root_path):] + ('.strm' if method == 'strm' else '') in target_set:
+            continue
+        ids.append(i)
+        ops.append(OP_ADD)
+    for j, target_path in enumerate(target_paths):
+        is_strm = target_path.endswith('.strm')
+        source_path = root_path + (target_path[:-len('.strm')] if is_strm else target_path)[len(target_prefix):]
+        method = dump.get_method(source_path, rules)
+        if method == 'ignore':
+            continue
+        if (method == 'strm') != is_strm:
+            continue  # 不是按规则生成的文件
+        if source_path in source_set:
+            continue
+        ids.append(j)
+        ops.append(OP_DELETE)
+    return ids, bytes(ops)
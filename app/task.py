@@ -27,6 +27,18 @@ class Task:
         """获取任务规则"""
         return self.data.get('rules', [])
 
+    def get_dir_rules(self):
+        """获取目录排除/包含规则，如 {"exclude": ["@eaDir", "Extras"], "include": []}"""
+        return self.data.get('dir_rules', {})
+
+    def get_enable_target_index(self):
+        """是否使用常驻内存的目标目录索引代替每次遍历目标目录"""
+        return self.data.get('enable_target_index', False)
+
+    def get_parallel_workers(self):
+        """获取并行比较目录树的进程数，0 或 1 表示不启用"""
+        return self.data.get('parallel_workers', 0)
+
     def get_logs(self):
         """获取任务日志"""
         return self.data.get('logs', [])
@@ -1,10 +1,42 @@
 import os
-from p115client import tool
+from fnmatch import fnmatchcase
+
+
+class DirRules:
+    def __init__(self, exclude=(), include=()):
+        """
+        目录级的排除/包含规则（glob 模式）
+        不含 '/' 的模式匹配目录名（如 "@eaDir"、"Extras"），含 '/' 的模式匹配相对任务根目录的路径（如 "*/Samples"）；
+        include 用于在 exclude 中保留例外
+
+        :param exclude: 排除模式列表
+        :param include: 包含模式列表
+        """
+        self.exclude = list(exclude)
+        self.include = list(include)
+
+    def __bool__(self):
+        return bool(self.exclude)
+
+    def is_excluded(self, name, rel_path):
+        """判断目录（连同其下所有子项）是否应被剪枝"""
+        return self._match(self.exclude, name, rel_path) and not self._match(self.include, name, rel_path)
+
+    @staticmethod
+    def _match(patterns, name, rel_path):
+        for pattern in patterns:
+            if fnmatchcase(rel_path if '/' in pattern else name, pattern):
+                return True
+        return False
+
 
 class Tree:
 
-    def get_source_tree(self, client, path):
+    def get_source_tree(self, client, path, dir_rules=None):
         ### 解析115目录树，生成目录数组
+        ### dir_rules 排除的目录在解析时即被剪枝，其子项按 parent_key 直接丢弃，不再拼接路径
+        ### 导出结果不区分文件和目录，条目第一次作为父目录出现时才按规则判断（导出按深度优先排列，子项紧跟在目录之后）
+        from p115client import tool  # p115client 较大，首次获取目录树时才导入
         try:
             it = tool.export_dir_parse_iter(
                 client=client, 
@@ -16,10 +48,28 @@ class Tree:
                 show_clock=True)
             i = 0
             path_index = {}
+            pruned = set()  # 被剪枝的目录及其子项的 key
+            checked = set()  # 已按 dir_rules 判断过的目录的 key
+            root_len = 0  # 任务根目录路径长度，用于计算相对路径
             source_tree = []
             for item in it:
                 i += 1
+                if item['parent_key'] in pruned:
+                    pruned.add(item['key'])
+                    continue
                 parent = path_index.get(item['parent_key'])
+                if parent is not None and dir_rules and parent['key'] not in checked:
+                    checked.add(parent['key'])
+                    if dir_rules.is_excluded(parent['name'], parent['path'][root_len:]):
+                        # 目录本身已加入目录树，剪枝时一并移除
+                        parent_path = parent['path'].replace('/', os.sep)
+                        if source_tree and source_tree[-1] == parent_path:
+                            source_tree.pop()
+                        else:
+                            source_tree.remove(parent_path)
+                        del path_index[parent['key']]
+                        pruned.update((parent['key'], item['key']))
+                        continue
                 if parent is None:
                     item['path'] = ''
                 else:
@@ -27,6 +77,10 @@ class Tree:
                         item['path'] = path
                     else:
                         item['path'] = "{0}/{1}".format(parent['path'], item['name'])
+                if i <= 2:
+                    checked.add(item['key'])  # 根目录和任务源目录本身不参与规则判断
+                if i == 2:
+                    root_len = len(item['path']) + 1
                 path_index[item['key']] = item
                 if item['path'] != '':
                     source_tree.append(item['path'].replace('/', os.sep))
@@ -35,16 +89,36 @@ class Tree:
             ### self.logger.error('生成目录树出错: %s' % e)
             raise e
         
-    def get_target_tree(self, base_dir: str, root_dir: str, target_tree: list):
+    def get_source_partitions(self, client, path):
+        ### 解析115目录树，按顶层目录分区但不拼接路径，路径拼接和分类由 parallel.diff 在进程池中完成
+        from p115client import tool
+        import parallel
+        it = tool.export_dir_parse_iter(
+            client=client, 
+            export_file_ids=path, 
+            target_pid=path, 
+            parse_iter=tool.parse_export_dir_as_dict_iter, 
+            delete=True,
+            async_=False,
+            show_clock=True)
+        return parallel.partition_export(it, path)
+
+    def get_target_tree(self, base_dir: str, root_dir: str, target_tree: list, dir_rules=None, rel_dir: str = ''):
         ### 获取目标路径目录树，用于处理差异
+        ### dir_rules 排除的目录不会被遍历；rel_dir 为当前目录相对任务目标目录的路径
         if not os.path.exists(root_dir):
             return target_tree
         dirs = os.listdir(root_dir)
         for dir in dirs:
             item = os.path.join(root_dir, dir)
-            target_tree.append(item.lstrip(base_dir + os.sep))
-            if os.path.isfile(item):
+            rel_path = "{0}/{1}".format(rel_dir, dir) if rel_dir else dir
+            is_dir = os.path.isdir(item)
+            # 规则只作用于目录，同名的文件不受影响
+            if is_dir and dir_rules and dir_rules.is_excluded(dir, rel_path):
+                continue
+            target_tree.append(os.path.relpath(item, base_dir))
+            if not is_dir:
                 # 如果是文件，则不用递归
                 continue
-            self.get_target_tree(base_dir, item, target_tree)
+            self.get_target_tree(base_dir, item, target_tree, dir_rules, rel_path)
         return target_tree
\ No newline at end of file
@@ -1,14 +1,23 @@
 import json
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from job import Job
+from collections import deque
 import logging
 import os
-import time
-from flask_socketio import emit
+import bisect
+import gzip
+import hashlib
+import shutil
+from datetime import datetime, timedelta
+
+# apscheduler、zstandard 和 job（依赖 p115client）都在首次使用时才导入，使 main 启动时导入本模块足够轻量；
+# 本模块不导入 flask_socketio，SocketIOHandler 使用调用方传入的 socketio 实例
+
+LOGS_FOLDER = 'logs'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
 
 class JobScheduler:
     def __init__(self):
+        from apscheduler.schedulers.background import BackgroundScheduler
         self.scheduler = BackgroundScheduler()
         self.scheduler.start()
 
@@ -18,13 +27,15 @@ class JobScheduler:
         :param task: Task 实例
         :param cron_expression: cron 表达式
         """
+        from apscheduler.triggers.cron import CronTrigger
         self.scheduler.add_job(self.run, CronTrigger.from_crontab(cron_expression), args=[task])
         logging.info(f"Scheduled job for task: {task.get_name()} with cron expression: {cron_expression}")
 
     def run(self, task):
         """执行任务"""
+        from job import Job  # 延迟导入，避免 util 与 job 循环导入
         logging.info(f"Running task: {task.get_name()}")
-        job = Job(task.get_name(), task)  # 创建一个 Job 实例并执行
+        job = Job(task)  # 创建一个 Job 实例并执行
         job.start()
 
     def stop(self):
@@ -32,55 +43,187 @@ class JobScheduler:
         self.scheduler.shutdown()
 
 class LogCleaner:
-    def __init__(self, retention_days):
+    def __init__(self, retention_days, task_retention_days=None, max_total_size_mb=None,
+                 compress_after_days=None, compression='gzip', batch_size=500, scheduler=None):
+        """
+        按 job 结束时间索引清理过期日志，不再遍历 logs/ 目录
+
+        :param retention_days: 默认日志保留天数
+        :param task_retention_days: 按任务名称单独设置的保留天数，如 {"Sample Task": 7}
+        :param max_total_size_mb: 日志总大小上限（MB），超出时从最旧的 job 开始删除
+        :param compress_after_days: 结束超过该天数的日志会被压缩，为空则不压缩
+        :param compression: 压缩格式，'gzip' 或 'zstd'（需要安装 zstandard）
+        :param batch_size: 每批删除的 job 数量，每批结束后保存一次 job.json
+        :param scheduler: 用于定时清理的调度器，为空时创建并启动独立的后台调度器
+        """
         self.retention_days = retention_days
-        self.scheduler = BackgroundScheduler()
-        self.scheduler.add_job(self.clean_logs, 'interval', days=1)
-        self.scheduler.start()
+        self.task_retention_days = task_retention_days or {}
+        self.max_total_size_mb = max_total_size_mb
+        self.compress_after_days = compress_after_days
+        self.compression = compression
+        self.batch_size = batch_size
+        self._job_data = None  # 最近一次载入的 job.json 数据
+        self._index = None  # 按 end_time 升序排列的已结束 job 记录
+        self._index_mtime = None  # 建立索引时 job.json 的修改时间
+        self._owns_scheduler = scheduler is None
+        if scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+            scheduler = BackgroundScheduler()
+            scheduler.start()
+        self.scheduler = scheduler
+        self.scheduler.add_job(self.clean, 'interval', days=1)
 
     def clean(self):
-        """清理过期日志文件和 jobs.json 中的过期任务"""
-        log_dir = 'logs/'
-        now = time.time()
-        delete_jobs = set()  # 用于存储需要删除的任务名称
-
-        # 遍历日志文件夹，检查哪些文件需要被清理
-        for log_file in os.listdir(log_dir):
-            file_path = os.path.join(log_dir, log_file)
-            if os.path.isfile(file_path):
-                file_age_days = (now - os.path.getmtime(file_path)) / (60 * 60 * 24)
-                if file_age_days > self.retention_days:
-                    # 清理过期日志文件
-                    os.remove(file_path)
-                    print(f"Deleted old log file: {file_path}")
-
-                    # 根据日志文件名获取任务名称，并添加到待删除的任务列表中
-                    log_filename = os.path.basename(file_path)
-                    job_name = log_filename.replace('.log', '')  # 去掉 .log 后缀
-                    delete_jobs.add(job_name)
-
-        # 一次性清理 jobs.json 中的过期任务
-        self._remove_jobs_from_json(delete_jobs)
-
-    def _remove_jobs_from_json(self, delete_jobs):
-        """根据任务名称列表删除 jobs.json 中的任务"""
+        """清理过期日志文件和 jobs.json 中的过期任务，然后压缩较旧的日志"""
+        job_data, index = self._get_index()
+        now = datetime.now()
+
+        expired = self._expired_head(index, now) | self._over_size_cap(index)
+        if expired:
+            expired_jobs = [job for job in index if job['name'] in expired]
+            for i in range(0, len(expired_jobs), self.batch_size):
+                batch = expired_jobs[i:i + self.batch_size]
+                for job in batch:
+                    self._delete_log(job['name'])
+                self._remove_jobs_from_json(job_data, {job['name'] for job in batch})
+            index = self._index = [job for job in index if job['name'] not in expired]
+            logging.info(f"Removed {len(expired)} expired jobs and their logs.")
+
+        if self.compress_after_days is not None:
+            self._compress_logs(job_data, index, now)
+
+    def _save_job_data(self, job_data):
+        """保存 job.json，并同步索引对应的修改时间"""
+        job_file_path = 'cache/job.json'
+        with open(job_file_path, 'w') as f:
+            json.dump(job_data, f, indent=4)
+        self._index_mtime = os.path.getmtime(job_file_path)
+
+    def _get_index(self):
+        """
+        获取 job 数据和按 end_time 排序的已结束 job 索引
+        job.json 自上次清理后没有变化时直接复用，不读取文件
+        """
         job_file_path = 'cache/job.json'
-        if os.path.exists(job_file_path):
+        if not os.path.exists(job_file_path):
+            self._job_data, self._index, self._index_mtime = {"jobs": []}, [], None
+            return self._job_data, self._index
+        mtime = os.path.getmtime(job_file_path)
+        if self._index is None or mtime != self._index_mtime:
             with open(job_file_path, 'r') as f:
-                job_data = json.load(f)
+                self._job_data = json.load(f)
+            finished = [job for job in self._job_data['jobs'] if job.get('end_time')]
+            self._index = sorted(finished, key=lambda job: job['end_time'])
+            self._index_mtime = mtime
+        return self._job_data, self._index
 
-            # 筛选出不在 delete_jobs 列表中的任务
-            job_data['jobs'] = [job for job in job_data['jobs'] if job['name'] not in delete_jobs]
+    def _retention_days(self, job):
+        """获取 job 所属任务的保留天数"""
+        task_name = job.get('task') or job['name'].rsplit('_', 1)[0]
+        return self.task_retention_days.get(task_name, self.retention_days)
 
-            # 保存更新后的 job.json
-            with open(job_file_path, 'w') as f:
-                json.dump(job_data, f, indent=4)
+    def _expired_head(self, index, now):
+        """
+        只扫描索引头部：结束时间早于最短保留期的 job 才可能过期，
+        遇到第一个晚于该时间的 job 即停止
+        """
+        shortest = min([self.retention_days, *self.task_retention_days.values()])
+        horizon = (now - timedelta(days=shortest)).isoformat()
+        expired = set()
+        for job in index:
+            if job['end_time'] >= horizon:
+                break
+            cutoff = (now - timedelta(days=self._retention_days(job))).isoformat()
+            if job['end_time'] < cutoff:
+                expired.add(job['name'])
+        return expired
+
+    def _over_size_cap(self, index):
+        """日志总大小超出上限时，从最旧的 job 开始删除，直到低于上限"""
+        if not self.max_total_size_mb:
+            return set()
+        # 只有缺少 log_size 的记录才需要 stat 日志文件
+        sizes = [job['log_size'] if 'log_size' in job else self._log_size(job['name']) for job in index]
+        total = sum(sizes)
+        limit = self.max_total_size_mb * 1024 * 1024
+        expired = set()
+        for job, size in zip(index, sizes):
+            if total <= limit:
+                break
+            expired.add(job['name'])
+            total -= size
+        return expired
+
+    def _log_size(self, job_name):
+        """获取 job 日志文件大小（job 记录中没有 log_size 时使用）"""
+        path = find_job_log(job_name)
+        return os.path.getsize(path) if path else 0
 
-            print(f"Removed {len(delete_jobs)} jobs from job.json.")
+    def _delete_log(self, job_name):
+        """删除 job 的日志文件（包括压缩后的文件）"""
+        path = find_job_log(job_name)
+        if path:
+            os.remove(path)
+
+    def _compress_logs(self, job_data, index, now):
+        """
+        压缩结束超过 compress_after_days 的日志
+        已压缩的 job 总在索引更靠前的位置，因此从截止点向前扫描，遇到已压缩的 job 即停止
+        """
+        cutoff = (now - timedelta(days=self.compress_after_days)).isoformat()
+        end = bisect.bisect_left([job['end_time'] for job in index], cutoff)
+        marked = compressed = 0
+        for job in reversed(index[:end]):
+            if job.get('compressed'):
+                break
+            path = compress_job_log(job['name'], self.compression)
+            if path:
+                job['log_size'] = os.path.getsize(path)
+                compressed += 1
+            job['compressed'] = True
+            marked += 1
+        if compressed:
+            logging.info(f"Compressed {compressed} job logs.")
+        if marked:
+            self._save_job_data(job_data)
+
+    def _remove_jobs_from_json(self, job_data, delete_jobs):
+        """根据任务名称列表删除 jobs.json 中的任务"""
+        job_data['jobs'] = [job for job in job_data['jobs'] if job['name'] not in delete_jobs]
+        self._save_job_data(job_data)
 
     def stop(self):
-        """停止定时任务清理器"""
-        self.scheduler.shutdown()
+        """停止定时任务清理器，传入的调度器由调用方负责关闭"""
+        if self._owns_scheduler:
+            self.scheduler.shutdown()
+
+
+def compress_job_log(job_name, compression='gzip'):
+    """
+    压缩 job 日志文件并删除原文件
+
+    :param compression: 'gzip' 或 'zstd'，zstandard 未安装时退回 gzip
+    :return: 压缩后的文件路径，日志文件不存在时返回 None
+    """
+    path = job_log_path(job_name)
+    if not os.path.exists(path):
+        return None
+    if compression == 'zstd':
+        try:
+            import zstandard
+            compressed_path = path + '.zst'
+            with open(path, 'rb') as src, open(compressed_path, 'wb') as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+            os.remove(path)
+            return compressed_path
+        except ImportError:
+            logging.warning("zstandard is not installed, falling back to gzip")
+    compressed_path = path + '.gz'
+    with open(path, 'rb') as src, gzip.open(compressed_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return compressed_path
+
 
 class SocketIOHandler(logging.Handler):
     def __init__(self, socketio, task_name):
@@ -92,5 +235,139 @@ class SocketIOHandler(logging.Handler):
     def emit(self, record):
         """将日志记录发送到 WebSocket"""
         log_message = self.format(record)  # 格式化日志信息
-        # 使用 emit 将日志信息推送到客户端
-        emit('log_update', {'task_name': self.task_name, 'message': log_message}, room=self.channel)
+        # 通过 SocketIO 实例推送，不依赖请求上下文，可在后台任务线程中使用
+        self.socketio.emit('log_update', {'task_name': self.task_name, 'message': log_message}, room=self.channel)
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity=1000):
+        """
+        内存中只保留最近 capacity 条日志，完整日志只写入每个 job 的日志文件
+
+        :param capacity: 环形缓冲区容量
+        """
+        super().__init__()
+        self.buffer = deque(maxlen=capacity)
+
+    def emit(self, record):
+        """将日志记录追加到环形缓冲区，超出容量时自动丢弃最旧的记录"""
+        self.buffer.append(self.format(record))
+
+
+def setup_job_logger(job_name, buffer_size=1000, handlers=()):
+    """
+    为 job 创建 logger：日志文件保存完整日志，环形缓冲区保存最近日志
+
+    :param job_name: job 名称，同时作为日志文件名
+    :param buffer_size: 内存日志缓冲区容量
+    :param handlers: 额外的日志处理器（如 SocketIOHandler）
+    :return: (logger, 环形缓冲区 deque)
+    """
+    os.makedirs(LOGS_FOLDER, exist_ok=True)
+    # 不通过 logging.getLogger 注册到全局 logger 表，job 结束后 logger 和其缓冲区可以被回收
+    logger = logging.Logger(job_name)
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    file_handler = logging.FileHandler(job_log_path(job_name))
+    ring_handler = RingBufferHandler(buffer_size)
+    for handler in (file_handler, ring_handler, *handlers):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return logger, ring_handler.buffer
+
+
+def close_job_logger(logger):
+    """job 结束时移除并关闭 logger 的所有处理器，释放日志文件句柄"""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+def job_log_path(job_name):
+    """获取 job 日志文件路径"""
+    return os.path.join(LOGS_FOLDER, f"{job_name}.log")
+
+
+def find_job_log(job_name):
+    """查找 job 日志文件，日志可能已被 LogCleaner 压缩；不存在或名称不合法时返回 None"""
+    if not is_valid_job_name(job_name):
+        return None
+    path = job_log_path(job_name)
+    for candidate in (path, path + '.gz', path + '.zst'):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def _open_job_log(path):
+    """以二进制方式打开日志文件，压缩日志透明解压"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.zst'):
+        import zstandard
+        return zstandard.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def is_valid_job_name(job_name):
+    """job 名称只能是 logs 目录下的文件名，不能包含路径分隔符或是 '.'、'..'"""
+    return bool(job_name) and job_name not in ('.', '..') and not any(c in job_name for c in '/\\\0')
+
+
+def job_log_etag(job_name, offset=0, limit=200, level=None):
+    """
+    根据日志文件和 job.json 的大小、修改时间生成 ETag，无需读取文件内容
+
+    日志文件和 job 记录都未变化且查询参数相同时 ETag 不变，轮询可直接返回 304；
+    job 名称可能包含中文或空格，ETag 使用摘要，保证是合法的 ASCII 头部值
+    """
+    path = find_job_log(job_name)
+    if path is None:
+        return None
+    st = os.stat(path)
+    job_file_path = 'cache/job.json'
+    job_mtime = os.stat(job_file_path).st_mtime_ns if os.path.exists(job_file_path) else 0
+    key = f"{job_name}\0{st.st_size}\0{st.st_mtime_ns}\0{job_mtime}\0{offset}\0{limit}\0{level or ''}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def read_job_log(job_name, offset=0, limit=200, level=None):
+    """
+    从指定字节偏移处读取 job 日志，用于分页和增量拉取（tail）
+
+    :param job_name: job 名称
+    :param offset: 起始字节偏移（上一次返回的 next_offset，压缩日志按解压后的内容计算）
+    :param limit: 最多返回的行数
+    :param level: 只返回该级别及以上的日志（如 'WARNING'），为空则不过滤
+    :return: {"lines": [...], "offset": offset, "next_offset": n, "eof": bool}
+    """
+    min_level = LOG_LEVELS.index(level.upper()) if level else 0
+    lines = []
+    next_offset = offset
+    path = find_job_log(job_name)
+    if path is None:
+        return {"lines": lines, "offset": offset, "next_offset": offset, "eof": True}
+
+    with _open_job_log(path) as f:
+        f.seek(offset)
+        while len(lines) < limit:
+            raw = f.readline()
+            if not raw.endswith(b'\n'):
+                # 文件末尾或者正在写入的半行，留到下次读取
+                break
+            next_offset += len(raw)
+            line = raw.decode('utf-8', errors='replace').rstrip('\n')
+            if min_level and _line_level(line) < min_level:
+                continue
+            lines.append(line)
+        eof = f.read(1) == b''
+    return {"lines": lines, "offset": offset, "next_offset": next_offset, "eof": eof}
+
+
+def _line_level(line):
+    """从日志行中解析日志级别，无法解析的行（如异常堆栈）视为最低级别"""
+    parts = line.split(' - ', 2)
+    if len(parts) > 1 and parts[1] in LOG_LEVELS:
+        return LOG_LEVELS.index(parts[1])
+    return 0
@@ -0,0 +1,95 @@
+# 并行比较目录树的扩展性基准：对合成的导出目录树，分别用 1、2、4、8 个进程执行 parallel.diff
+#
+# 用法：python bench/parallel.py [--entries 1000000] [--tops 400] [--workers 1 2 4 8]
+# 输出每个进程数的耗时以及相对单进程的加速比，并检查结果与 Dump.parseTree 一致（需在仓库根目录运行，Dump 读取 config/config.json）
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import dump  # noqa: E402
+import parallel  # noqa: E402
+from task import Task  # noqa: E402
+
+RULES = [
+    {"name": "Video Files", "extensions": ".mp4;.mkv;.avi", "method": "strm", "attribute": "smb"},
+    {"name": "Subtitle Files", "extensions": ".srt;.ass", "method": "copy", "attribute": ""},
+]
+SOURCE_PATH = '/media/library'
+TARGET_PREFIX = 'strm/library'
+
+
+def make_export(entries, tops, seed=0):
+    """
+    生成合成的导出目录树条目、对应的源目录树，以及已同步了大约一半文件的目标目录树
+
+    目标目录树中还有源文件已删除的 .strm 和字幕副本（应删除），以及不是按规则生成的文件（应保留）
+    """
+    rng = random.Random(seed)
+    items = [{'key': 0, 'parent_key': -1, 'name': ''}, {'key': 1, 'parent_key': 0, 'name': 'library'}]
+    paths = {1: SOURCE_PATH}
+    dirs = []
+    target_tree = []
+    for key in range(2, entries + 2):
+        if key < tops + 2:
+            parent, name, is_dir = 1, f"Show {key}", True
+        else:
+            parent = rng.choice(dirs)
+            is_dir = rng.random() < 0.1
+            name = f"Season {key}" if is_dir else f"Episode {key}" + rng.choice(['.mkv', '.mp4', '.srt', '.nfo'])
+        items.append({'key': key, 'parent_key': parent, 'name': name})
+        paths[key] = f"{paths[parent]}/{name}"
+        target = TARGET_PREFIX + paths[key][len(SOURCE_PATH):]
+        if is_dir:
+            dirs.append(key)
+            target_tree.append(target)
+        elif rng.random() < 0.5:
+            target_tree.append(target + '.strm' if name.endswith(('.mkv', '.mp4')) else target)
+        if not is_dir and rng.random() < 0.02:
+            stale = TARGET_PREFIX + paths[parent][len(SOURCE_PATH):] + f"/Stale {key}"
+            target_tree.extend([stale + '.mkv.strm', stale + '.srt', stale + '.mkv'])
+    return items, [paths[key] for key in range(1, entries + 2)], target_tree
+
+
+def parse_tree(source_tree, target_tree):
+    """用 Dump.parseTree 计算同一输入的差异，作为并行结果的对照"""
+    task = Task({"name": "bench", "source_path": SOURCE_PATH, "target_path": '/' + TARGET_PREFIX, "rules": RULES})
+    return dump.Dump(source_tree, target_tree, task).parseTree(source_tree, target_tree)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process-pool diff scaling benchmark')
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--tops', type=int, default=400, help='number of top-level directories')
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    items, source_tree, target_tree = make_export(args.entries, args.tops)
+    print(f"{args.entries} entries, {args.tops} top-level dirs, {len(target_tree)} target entries, "
+          f"{os.cpu_count()} CPUs")
+
+    expected_added, expected_deleted = parse_tree(source_tree, target_tree)
+    expected = (sorted(expected_added), sorted(expected_deleted))
+    print(f"Dump.parseTree: added={len(expected_added)} deleted={len(expected_deleted)}")
+
+    baseline = None
+    mismatched = False
+    for workers in args.workers:
+        start = time.perf_counter()
+        root_path, partitions = parallel.partition_export(iter(items), SOURCE_PATH)
+        added, deleted = parallel.diff(root_path, partitions, target_tree, TARGET_PREFIX, RULES, None, workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        match = (sorted(added), sorted(deleted)) == expected
+        mismatched = mismatched or not match
+        print(f"workers={workers:<2} {elapsed:7.2f} s  speedup {baseline / elapsed:4.2f}x  "
+              f"added={len(added)} deleted={len(deleted)}  {'matches' if match else 'DIFFERS FROM'} Dump.parseTree")
+    return 1 if mismatched else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
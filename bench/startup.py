@@ -0,0 +1,71 @@
+# 启动耗时基准：用 python -X importtime 检查入口模块的导入耗时和导入的模块，防止启动变慢
+#
+# 用法：python bench/startup.py [--budget-ms 800] [--runs 5]
+# 超出预算或启动时导入了重型依赖时以非 0 状态退出
+
+import argparse
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+# 启动时（导入 main/job/util 时）不应导入的重型依赖，只允许在首次使用时导入
+HEAVY_MODULES = ('p115client', 'apscheduler', 'requests', 'inotify_simple', 'zstandard')
+
+# 模块 -> 默认耗时预算（毫秒）
+BUDGETS = {
+    'main': 800,
+    'job': 150,
+    'util': 50,
+}
+
+
+def import_time(module):
+    """在新的解释器中导入模块，返回 (累计耗时毫秒, 导入的顶层模块集合)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=APP_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    total_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        # 格式：import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        imported.add(name.split('.')[0])
+        if name == module:
+            total_us = int(cumulative)
+    return total_us / 1000, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup import-time budget check')
+    parser.add_argument('--budget-ms', type=float, help='override the budget of every module')
+    parser.add_argument('--runs', type=int, default=5, help='runs per module, the fastest one is used')
+    parser.add_argument('modules', nargs='*', default=list(BUDGETS))
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        budget = args.budget_ms or BUDGETS.get(module, 100)
+        try:
+            runs = [import_time(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module:<8} ERROR {e}")
+            failed = True
+            continue
+        best = min(ms for ms, _ in runs)
+        heavy = sorted(set(HEAVY_MODULES) & runs[0][1])
+        ok = best <= budget and not heavy
+        failed |= not ok
+        print(f"{module:<8} {best:8.1f} ms  budget {budget:6.0f} ms  {'OK' if ok else 'FAIL'}"
+              + (f"  heavy imports: {', '.join(heavy)}" if heavy else ''))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import dump  # noqa: E402
+import index  # noqa: E402
+import task  # noqa: E402
+import tree  # noqa: E402
+
+RULES = [
+    {"name": "Video Files", "extensions": ".mp4;.mkv", "method": "strm", "attribute": "smb"},
+    {"name": "Subtitle Files", "extensions": ".srt", "method": "copy", "attribute": ""},
+]
+
+
+class DumpRunTest(unittest.TestCase):
+    """在临时挂载目录上完整执行 Dump.run"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.mount = os.path.join(self.tmp.name, 'mount')
+        os.makedirs('config')
+        with open('config/config.json', 'w') as f:
+            json.dump({"mount_path": self.mount, "strm_prefix": {"smb": "smb://nas/115/"}}, f)
+
+        # 挂载目录中的源文件和目标目录中已经过期的 .strm 文件
+        for path in ('cloud/src/Show/a.mkv', 'cloud/src/Show/a.srt', 'lib/Old/gone.mkv.strm'):
+            os.makedirs(os.path.dirname(os.path.join(self.mount, path)), exist_ok=True)
+            with open(os.path.join(self.mount, path), 'w') as f:
+                f.write('x')
+
+        self.task = task.Task({"name": "T", "source_path": "/cloud/src", "target_path": "/lib", "rules": RULES})
+        self.source_tree = ['/cloud/src', '/cloud/src/Show', '/cloud/src/Show/a.mkv', '/cloud/src/Show/a.srt']
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def target_tree(self):
+        return tree.Tree().get_target_tree(self.mount, os.path.join(self.mount, 'lib'), [])
+
+    def test_run_applies_changes_and_records_journal(self):
+        target_index = index.TargetIndex(self.mount, os.path.join(self.mount, 'lib'), watch=False)
+        d = dump.Dump(self.source_tree, self.target_tree(), self.task, target_index=target_index)
+        d.run()
+
+        lib = os.path.join(self.mount, 'lib')
+        with open(os.path.join(lib, 'Show/a.mkv.strm')) as f:
+            self.assertEqual(f.read(), 'smb://nas/115/cloud/src/Show/a.mkv')
+        self.assertTrue(os.path.isfile(os.path.join(lib, 'Show/a.srt')))
+        self.assertFalse(os.path.exists(os.path.join(lib, 'Old/gone.mkv.strm')))
+        self.assertEqual(d.changed_dirs, {os.path.join(lib, 'Show'), os.path.join(lib, 'Old')})
+        self.assertEqual(sorted(target_index.snapshot()), sorted(self.target_tree()))
+
+        # 第二次运行没有任何差异
+        self.assertEqual(dump.Dump(self.source_tree, self.target_tree(), self.task).parseTree(
+            self.source_tree, self.target_tree()), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import inotify_simple  # noqa: E402
+import index  # noqa: E402
+import tree  # noqa: E402
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('x')
+
+
+class TargetIndexWatchTest(unittest.TestCase):
+    """inotify 监听外部修改，保持索引与目标目录一致"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        self.lib = os.path.join(self.base, 'lib')
+        touch(os.path.join(self.lib, 'Show', 'a.mkv.strm'))
+        self.indexes = []
+
+    def tearDown(self):
+        for target_index in self.indexes:
+            target_index.stop()
+            target_index._thread.join(5)
+        self.tmp.cleanup()
+
+    def start_index(self, **kwargs):
+        target_index = index.TargetIndex(self.base, self.lib, restart_delay=0.1, **kwargs)
+        self.indexes.append(target_index)
+        target_index._ready.wait(5)
+        return target_index
+
+    def walk(self):
+        return sorted(tree.Tree().get_target_tree(self.base, self.lib, []))
+
+    def assertIndexed(self, target_index, expected=None):
+        """等待监听线程处理完事件后，索引与目标目录一致"""
+        expected = expected if expected is not None else self.walk()
+        deadline = time.monotonic() + 5
+        while sorted(target_index.snapshot()) != expected and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(sorted(target_index.snapshot()), expected)
+
+    def test_create_and_move_in(self):
+        target_index = self.start_index()
+        touch(os.path.join(self.lib, 'Show', 'b.mkv.strm'))
+        os.makedirs(os.path.join(self.lib, 'Empty'))
+        # 整体移动进来的目录，其子树没有单独的事件
+        touch(os.path.join(self.base, 'outside', 'Movie', 'c.mkv.strm'))
+        os.rename(os.path.join(self.base, 'outside', 'Movie'), os.path.join(self.lib, 'Movie'))
+        os.remove(os.path.join(self.lib, 'Show', 'a.mkv.strm'))
+
+        self.assertIndexed(target_index)
+        self.assertIn(os.path.join('lib', 'Movie', 'c.mkv.strm'), target_index.snapshot())
+
+    def test_overflow_rescans(self):
+        overflow = threading.Event()
+
+        class OverflowingINotify(inotify_simple.INotify):
+            def read(self, timeout=None, read_delay=None):
+                if overflow.is_set():
+                    overflow.clear()
+                    return [inotify_simple.Event(-1, inotify_simple.flags.Q_OVERFLOW, 0, '')]
+                return super().read(timeout=timeout, read_delay=read_delay)
+
+        with mock.patch.object(inotify_simple, 'INotify', OverflowingINotify):
+            target_index = self.start_index()
+            # 模拟队列溢出时丢失的事件，溢出后的全量扫描使索引恢复一致
+            with target_index.lock:
+                target_index.children[os.path.join('lib', 'Show')] = set()
+            overflow.set()
+            self.assertIndexed(target_index)
+        self.assertFalse(overflow.is_set())
+
+    def test_root_deleted_and_recreated(self):
+        target_index = self.start_index()
+        shutil.rmtree(self.lib)
+        self.assertIndexed(target_index, [])
+
+        os.makedirs(os.path.join(self.lib, 'New'))
+        touch(os.path.join(self.lib, 'New', 'd.mkv.strm'))
+        self.assertIndexed(target_index)
+        self.assertIn(os.path.join('lib', 'New', 'd.mkv.strm'), target_index.snapshot())
+
+        # 重新建立的监听继续跟踪外部修改
+        touch(os.path.join(self.lib, 'New', 'e.mkv.strm'))
+        self.assertIndexed(target_index)
+
+    def test_rules_change_rebuilds_shared_index(self):
+        touch(os.path.join(self.lib, 'Show', 'Extras', 'x.mkv.strm'))
+        index._indexes.clear()
+        self.addCleanup(index._indexes.clear)
+        excluded = index.get_target_index(self.base, self.lib, dir_rules=tree.DirRules(['Extras']))
+        self.indexes.append(excluded)
+        self.assertNotIn(os.path.join('lib', 'Show', 'Extras'), excluded.snapshot())
+        self.assertIs(index.get_target_index(self.base, self.lib, dir_rules=tree.DirRules(['Extras'])), excluded)
+
+        rebuilt = index.get_target_index(self.base, self.lib, dir_rules=tree.DirRules())
+        self.indexes.append(rebuilt)
+        self.assertIsNot(rebuilt, excluded)
+        self.assertTrue(excluded._stop.is_set())
+        self.assertIndexed(rebuilt)
+
+
+if __name__ == '__main__':
+    unittest.main()
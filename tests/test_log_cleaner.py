@@ -0,0 +1,93 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import util  # noqa: E402
+
+
+class StubScheduler:
+    """代替 apscheduler，测试中手动调用 clean"""
+
+    def add_job(self, *args, **kwargs):
+        pass
+
+
+class LogCleanerTest(unittest.TestCase):
+    """在临时目录中按 job.json 索引清理和压缩日志"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('cache')
+        os.makedirs(util.LOGS_FOLDER)
+        self.now = datetime.now()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write_jobs(self, jobs):
+        """jobs: [(job 名称, 任务名称, 结束于几天前, 日志字节数)]"""
+        records = []
+        for name, task, days_ago, size in jobs:
+            with open(util.job_log_path(name), 'w') as f:
+                f.write('x' * (size - 1) + '\n')
+            records.append({"name": name, "task": task, "status": "completed",
+                            "end_time": (self.now - timedelta(days=days_ago)).isoformat(), "log_size": size})
+        with open('cache/job.json', 'w') as f:
+            json.dump({"jobs": records}, f)
+
+    def job_names(self):
+        with open('cache/job.json') as f:
+            return [job['name'] for job in json.load(f)['jobs']]
+
+    def cleaner(self, retention_days=30, **kwargs):
+        return util.LogCleaner(retention_days, scheduler=StubScheduler(), **kwargs)
+
+    def test_per_task_retention(self):
+        self.write_jobs([('A_1', 'A', 10, 10), ('B_1', 'B', 10, 10), ('A_2', 'A', 1, 10), ('B_2', 'B', 40, 10)])
+        self.cleaner(task_retention_days={"A": 7}).clean()
+
+        self.assertEqual(self.job_names(), ['B_1', 'A_2'])
+        self.assertEqual(sorted(os.listdir(util.LOGS_FOLDER)), ['A_2.log', 'B_1.log'])
+
+    def test_size_cap_removes_oldest(self):
+        mb = 1024 * 1024
+        self.write_jobs([('T_3', 'T', 1, mb), ('T_1', 'T', 3, mb), ('T_2', 'T', 2, mb)])
+        self.cleaner(max_total_size_mb=2).clean()
+
+        self.assertEqual(self.job_names(), ['T_3', 'T_2'])
+        self.assertIsNone(util.find_job_log('T_1'))
+
+    def test_compression_and_transparent_read(self):
+        self.write_jobs([('T_1', 'T', 5, 10), ('T_2', 'T', 1, 10)])
+        with open(util.job_log_path('T_1'), 'w') as f:
+            f.write('2024-01-01 00:00:00,000 - INFO - started\n2024-01-01 00:00:01,000 - ERROR - failed\n')
+        cleaner = self.cleaner(compress_after_days=3)
+        cleaner.clean()
+
+        self.assertEqual(sorted(os.listdir(util.LOGS_FOLDER)), ['T_1.log.gz', 'T_2.log'])
+        with open('cache/job.json') as f:
+            jobs = {job['name']: job for job in json.load(f)['jobs']}
+        self.assertTrue(jobs['T_1']['compressed'])
+        self.assertEqual(jobs['T_1']['log_size'], os.path.getsize(util.find_job_log('T_1')))
+        self.assertNotIn('compressed', jobs['T_2'])
+
+        logs = util.read_job_log('T_1', level='ERROR')
+        self.assertEqual(logs['lines'], ['2024-01-01 00:00:01,000 - ERROR - failed'])
+        self.assertTrue(logs['eof'])
+
+        # 再次清理时已压缩的 job 不会重复处理，job.json 也不会被改写
+        mtime = os.path.getmtime('cache/job.json')
+        cleaner.clean()
+        self.assertEqual(os.path.getmtime('cache/job.json'), mtime)
+
+
+if __name__ == '__main__':
+    unittest.main()
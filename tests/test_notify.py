@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import notify  # noqa: E402
+
+
+class MediaServerStandIn(BaseHTTPRequestHandler):
+    """本地媒体服务器替身，记录收到的刷新请求"""
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests.append((self.path, self.headers['X-Emby-Token'], [u['Path'] for u in body['Updates']]))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class LibraryNotifierTest(unittest.TestCase):
+
+    def setUp(self):
+        MediaServerStandIn.requests = []
+        self.server = HTTPServer(('127.0.0.1', 0), MediaServerStandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        notify._notifier = None
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        notify._notifier = None
+
+    def test_coalesced_batches_and_max_delay(self):
+        notifier = notify.get_notifier({
+            "enabled": True,  # 未知的键被忽略
+            "url": f"http://127.0.0.1:{self.server.server_port}",
+            "api_key": "key",
+            "debounce_seconds": 1.0,
+            "max_delay_seconds": 1.0,
+            "path_map": {"/mnt/lib": "/media"},
+        })
+        # 持续的变更不断重置防抖计时，但不会超过 max_delay_seconds
+        for dirs in ({"/mnt/lib/tv/A/S1", "/mnt/lib/tv/A"}, {"/mnt/lib/movies/X"}, {"/mnt/lib/tv/A/S2"}):
+            notifier.notify(dirs)
+            time.sleep(0.4)
+        # 最后一次变更后的防抖要到 1.8 秒才到期，max_delay_seconds 使通知在 1.0 秒时发出
+        time.sleep(0.3)
+
+        self.assertEqual(MediaServerStandIn.requests,
+                         [('/Library/Media/Updated', 'key', ['/media/movies/X', '/media/tv/A'])])
+
+    def test_batches_instead_of_leaving_the_library(self):
+        notifier = notify.get_notifier({
+            "url": f"http://127.0.0.1:{self.server.server_port}",
+            "debounce_seconds": 0.1,
+            "path_map": {"/volume1/cloud/115": "/media"},
+            "max_paths": 2,
+            "batch_size": 2,
+        })
+        notifier.notify({"/volume1/cloud/115/lib/A", "/volume1/cloud/115/lib/B"}, root="/volume1/cloud/115/lib")
+        notifier.notify({"/volume1/cloud/115/movies/X/1", "/volume1/cloud/115/other/Y"})
+        time.sleep(0.5)
+
+        # 不会合并为任务目标目录或 path_map 前缀（整个媒体库），超出 max_paths 的部分分批发送
+        self.assertEqual(sorted(path for request in MediaServerStandIn.requests for path in request[2]),
+                         ['/media/lib/A', '/media/lib/B', '/media/movies', '/media/other'])
+        self.assertEqual(len(MediaServerStandIn.requests), 2)
+
+    def test_disabled(self):
+        self.assertIsNone(notify.get_notifier({"enabled": False, "url": "http://127.0.0.1:1"}))
+
+
+class CoalesceDirsTest(unittest.TestCase):
+
+    def test_stops_at_roots(self):
+        dirs = {"/volume1/cloud/115/lib/A/S1", "/volume1/cloud/115/lib/B", "/volume1/cloud/115/movies/X",
+                "/volume1/cloud/115/other/Y"}
+        self.assertEqual(notify.coalesce_dirs(dirs, 2, ["/volume1/cloud/115", "/volume1/cloud/115/lib"]),
+                         ["/volume1/cloud/115/lib/A", "/volume1/cloud/115/lib/B", "/volume1/cloud/115/movies",
+                          "/volume1/cloud/115/other"])
+        # 不属于任何 root 的目录保持不变
+        self.assertEqual(notify.coalesce_dirs({"/tmp/a/b", "/tmp/a/c"}, 1, ["/volume1"]), ["/tmp/a/b", "/tmp/a/c"])
+        self.assertEqual(notify.coalesce_dirs({"/tmp/a/b", "/tmp/a/c"}, 1), ["/tmp/a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import dump  # noqa: E402
+import parallel  # noqa: E402
+import task  # noqa: E402
+import tree  # noqa: E402
+
+RULES = [
+    {"name": "Video Files", "extensions": ".mp4;.mkv", "method": "strm", "attribute": "smb"},
+    {"name": "Subtitle Files", "extensions": ".srt", "method": "copy", "attribute": ""},
+]
+
+# (key, parent_key, name)，按导出结果的深度优先顺序排列
+EXPORT = [
+    (1, 0, ''), (2, 1, 'src'),
+    (3, 2, 'Show'), (4, 3, 'a.mkv'), (5, 3, 'a.srt'), (6, 3, 'Extras'), (7, 6, 'b.mkv'),
+    (8, 2, 'Extras'),  # 与排除的目录同名的文件
+    (9, 2, 'c.mkv'),
+]
+SOURCE_TREE = ['/src', '/src/Show', '/src/Show/a.mkv', '/src/Show/a.srt', '/src/Extras', '/src/c.mkv']
+TARGET_TREE = [
+    'lib/Show', 'lib/Show/a.srt', 'lib/c.mkv.strm',
+    'lib/Show/gone.mkv.strm', 'lib/Show/gone.srt',  # 源文件已删除
+    'lib/Show/a.mkv', 'lib/d.mkv',  # 不是按规则生成的文件
+]
+
+
+class ParallelDiffTest(unittest.TestCase):
+    """并行差异比较与 Dump.parseTree 结果一致"""
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        os.makedirs('config')
+        with open('config/config.json', 'w') as f:
+            json.dump({"mount_path": self.tmp.name}, f)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_matches_parse_tree(self):
+        items = [{'key': key, 'parent_key': parent, 'name': name} for key, parent, name in EXPORT]
+        root_path, partitions = parallel.partition_export(iter(items), '/src')
+        t = task.Task({"name": "T", "source_path": "/src", "target_path": "/lib", "rules": RULES})
+        expected = dump.Dump(SOURCE_TREE, TARGET_TREE, t).parseTree(SOURCE_TREE, TARGET_TREE)
+        self.assertEqual(expected, (['/src/Show/a.mkv'], ['lib/Show/gone.mkv.strm', 'lib/Show/gone.srt']))
+
+        for workers in (1, 2):
+            added, deleted = parallel.diff(root_path, partitions, TARGET_TREE, 'lib', RULES,
+                                           tree.DirRules(['Extras']), workers)
+            self.assertEqual((sorted(added), sorted(deleted)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import index  # noqa: E402
+import tree  # noqa: E402
+
+DIR_RULES = tree.DirRules(exclude=['Extras', '@eaDir', 'Movies/*/Samples'], include=['Keep/Extras'])
+
+# (key, parent_key, name)
+EXPORT = [
+    (1, 0, ''), (2, 1, 'src'),
+    (3, 2, 'Show'), (4, 3, 'Extras'), (5, 4, 'x.mkv'), (6, 4, 'Deep'), (7, 6, 'y.mkv'),
+    (8, 3, 'a.mkv'),
+    (9, 2, 'Movies'), (10, 9, 'M'), (11, 10, 'Samples'), (12, 10, 'm.mkv'),
+    (13, 2, 'Extras'),  # 与排除的目录同名的文件
+    (14, 2, 'Keep'), (15, 14, 'Extras'), (16, 15, 'k.mkv'),
+    # 目录与其子项不相邻：@eaDir 第一次作为父目录出现时已不是最后一项
+    (17, 2, '@eaDir'), (18, 2, 'b.mkv'), (19, 17, 'thumb.jpg'), (20, 11, 's.mkv'),
+]
+EXPECTED = [
+    '/src', '/src/Show', '/src/Show/a.mkv', '/src/Movies', '/src/Movies/M', '/src/Movies/M/m.mkv',
+    '/src/Extras', '/src/Keep', '/src/Keep/Extras', '/src/Keep/Extras/k.mkv', '/src/b.mkv',
+]
+
+
+class SourceTreeTest(unittest.TestCase):
+    """导出目录树按 dir_rules 剪枝，规则只作用于目录"""
+
+    def get_source_tree(self, export, dir_rules=DIR_RULES):
+        items = [{'key': key, 'parent_key': parent, 'name': name} for key, parent, name in export]
+        p115_tool = types.SimpleNamespace(export_dir_parse_iter=lambda **kwargs: iter(items),
+                                          parse_export_dir_as_dict_iter=None)
+        with mock.patch.dict(sys.modules, {'p115client': types.SimpleNamespace(tool=p115_tool),
+                                           'p115client.tool': p115_tool}):
+            return tree.Tree().get_source_tree(None, '/src', dir_rules)
+
+    def test_excluded_subtrees_are_pruned(self):
+        self.assertEqual(sorted(self.get_source_tree(EXPORT)), sorted(EXPECTED))
+
+    def test_without_rules(self):
+        source_tree = self.get_source_tree(EXPORT, None)
+        self.assertEqual(len(source_tree), len(EXPORT) - 1)
+        self.assertIn('/src/Show/Extras/Deep/y.mkv', source_tree)
+
+
+class TargetTreeTest(unittest.TestCase):
+    """目标目录遍历和索引快照按 dir_rules 剪枝，同名文件保留"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.lib = os.path.join(self.tmp.name, 'lib')
+        for path in ('Show/Extras/x.mkv.strm', 'Show/a.mkv.strm', 'Movies/M/Samples/s.mkv.strm',
+                     'Movies/M/m.mkv.strm', 'Extras', 'Keep/Extras/k.mkv.strm', '@eaDir/thumb.jpg'):
+            path = os.path.join(self.lib, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('x')
+        self.expected = sorted(os.path.join('lib', path) for path in (
+            'Show', 'Show/a.mkv.strm', 'Movies', 'Movies/M', 'Movies/M/m.mkv.strm', 'Extras',
+            'Keep', 'Keep/Extras', 'Keep/Extras/k.mkv.strm'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_target_tree(self):
+        self.assertEqual(sorted(tree.Tree().get_target_tree(self.tmp.name, self.lib, [], DIR_RULES)), self.expected)
+
+    def test_index_snapshot(self):
+        # 索引本身不剪枝，快照时按规则过滤
+        target_index = index.TargetIndex(self.tmp.name, self.lib, watch=False)
+        self.assertEqual(sorted(target_index.snapshot(DIR_RULES)), self.expected)
+        # 构建时剪枝的索引与之一致
+        pruned_index = index.TargetIndex(self.tmp.name, self.lib, watch=False, dir_rules=DIR_RULES)
+        self.assertEqual(sorted(pruned_index.snapshot()), self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()